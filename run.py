@@ -1,156 +1,394 @@
 #!/usr/bin/env python
 import os
+
+# 在导入LangChain之前关闭追踪，避免为每次调用安装追踪回调
+os.environ.setdefault("LANGCHAIN_TRACING_V2", "false")
+
 import json
-import glob
-from typing import Dict, Any, Optional, List, Union, Tuple
-from pdf2image import convert_from_path
-from PIL import Image
+import re
+from typing import Dict, Any, Optional, List, Union, Tuple, Iterator
+try:
+    import orjson
+except ImportError:
+    orjson = None
 import time
-from dotenv import load_dotenv
 import io
+import tempfile
+import hashlib
+import itertools
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 # from src.chat2table.models.config import ModelConfig
 # from src.chat2table.chains.image_processing import ImageProcessingChain
 # from src.chat2table.utils.logger import logger
+# from src.chat2table.utils.env import get_api_key
 
-from chat2table.models.config import ModelConfig
-from chat2table.chains.image_processing import ImageProcessingChain
+# LangChain、pdf2image和pypdfium2均在首次使用时才导入，加快启动速度，
+# 没有PDF输入时也不会加载PDF渲染相关模块
 from chat2table.utils.logger import logger
+from chat2table.utils.env import get_api_key
+
+# 支持的图片文件扩展名
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.bmp'})
+
+# PDF文件扩展名
+PDF_EXTENSION = '.pdf'
+
+# 预编译的扩展名匹配规则（不区分大小写），目录遍历时每个文件只需一次匹配
+_IMAGE_RE = re.compile(
+    "(?:%s)$" % "|".join(map(re.escape, sorted(IMAGE_EXTENSIONS))), re.IGNORECASE
+)
+_PDF_RE = re.compile(re.escape(PDF_EXTENSION) + "$", re.IGNORECASE)
+
+def _get_render_dpi(default: int = 150) -> int:
+    """读取环境变量PDF_RENDER_DPI，未设置或不是正整数时使用默认值"""
+    value = os.getenv("PDF_RENDER_DPI")
+    if value is None:
+        return default
+    try:
+        dpi = int(value)
+    except ValueError:
+        dpi = 0
+    if dpi <= 0:
+        logger.warning("PDF_RENDER_DPI必须为正整数，当前值: %s，使用默认值 %s", value, default)
+        return default
+    return dpi
 
-def get_api_key() -> str:
-    """从环境变量获取API密钥"""
-    api_key = os.getenv("DASHSCOPE_API_KEY")
-    if not api_key and os.path.exists(".env"):
-        load_dotenv()
-        api_key = os.getenv("DASHSCOPE_API_KEY")
+# PDF页面渲染分辨率，150 DPI已足够视觉模型识别文字
+# 可通过环境变量PDF_RENDER_DPI调整
+PDF_RENDER_DPI = _get_render_dpi()
+
+# PDF渲染页面缓存目录
+PDF_CACHE_DIR = os.path.join(".cache", "pdfpages")
+
+# 最多保留的PDF页面缓存数（每个PDF文件及分辨率一份），超出时按最近使用时间淘汰最旧的缓存
+PDF_CACHE_MAX_ENTRIES = 32
+
+def _read_file(file_path: str) -> bytes:
+    """按文件大小一次性读取整个文件，绕过Python缓冲IO层"""
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, size)
+        # 单次read可能读不满（如大文件或特殊文件系统），继续读取剩余部分
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+    finally:
+        os.close(fd)
+
+@lru_cache(maxsize=1)
+def _get_pdfium():
+    """导入pypdfium2，未安装时返回None"""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    return pypdfium2
+
+# PDFium不是线程安全的，即使操作的是不同文档也不能并发调用，所有PDFium调用都在此锁内串行执行
+_PDFIUM_LOCK = threading.Lock()
+
+def _render_pdf_with_pdfium(pdf_path: str, dpi: int = PDF_RENDER_DPI) -> Iterator[Tuple[bytes, int]]:
+    """使用PDFium在进程内逐页渲染PDF，无需启动外部子进程
+
+    渲染在_PDFIUM_LOCK内进行，JPEG编码在锁外进行，多个PDF并行转换时只有编码部分真正并行
+    """
+    pdfium = _get_pdfium()
+    with _PDFIUM_LOCK:
+        pdf = pdfium.PdfDocument(pdf_path)
+        page_count = len(pdf)
+    try:
+        for i in range(page_count):
+            with _PDFIUM_LOCK:
+                page = pdf[i]
+                try:
+                    bitmap = page.render(scale=dpi / 72)
+                    try:
+                        # to_pil返回的图像与位图共享内存，复制后才能在锁外释放位图后继续使用
+                        img = bitmap.to_pil().copy()
+                    finally:
+                        bitmap.close()
+                finally:
+                    page.close()
+            img_byte_arr = io.BytesIO()
+            img.save(img_byte_arr, format='JPEG', quality=85)
+            yield (img_byte_arr.getvalue(), i+1)
+    finally:
+        with _PDFIUM_LOCK:
+            pdf.close()
+
+def _render_pdf_with_poppler(pdf_path: str, dpi: int = PDF_RENDER_DPI,
+                             thread_count: Optional[int] = None) -> Iterator[Tuple[bytes, int]]:
+    """使用Poppler将PDF页面渲染为JPEG文件写入临时目录，再逐页读取，thread_count默认为CPU核数"""
+    from pdf2image import convert_from_path
     
-    if not api_key:
-        raise ValueError(
-            "未找到API密钥。请通过以下方式之一设置：\n"
-            "1. 设置环境变量 DASHSCOPE_API_KEY\n"
-            "2. 在项目根目录创建.env文件并添加 DASHSCOPE_API_KEY=your_key"
+    with tempfile.TemporaryDirectory() as output_folder:
+        page_paths = convert_from_path(
+            pdf_path,
+            dpi=dpi,
+            output_folder=output_folder,
+            paths_only=True,
+            fmt='jpeg',
+            # 与PDFium路径一致不启用optimize，额外的霍夫曼优化轮次耗费CPU但体积收益很小
+            jpegopt={'quality': 85},
+            thread_count=thread_count or os.cpu_count() or 1,
+            # pdftocairo直接输出JPEG，渲染质量与速度均优于pdftoppm
+            use_pdftocairo=True
         )
-    return api_key
+        for i, page_path in enumerate(page_paths):
+            yield (_read_file(page_path), i+1)
 
-def convert_pdf_to_images(pdf_path: str) -> List[Tuple[bytes, int]]:
-    """将PDF文件转换为图片字节数据"""
+def _render_pdf(pdf_path: str, dpi: int = PDF_RENDER_DPI,
+                thread_count: Optional[int] = None) -> Iterator[Tuple[bytes, int]]:
+    """渲染PDF页面，已安装pypdfium2时在进程内渲染，否则回退到pdf2image（Poppler）"""
+    if _get_pdfium() is not None:
+        return _render_pdf_with_pdfium(pdf_path, dpi)
+    return _render_pdf_with_poppler(pdf_path, dpi, thread_count)
+
+def _pdf_cache_dir(pdf_path: str, dpi: int = PDF_RENDER_DPI) -> str:
+    """根据PDF路径、修改时间、大小及渲染分辨率计算页面缓存目录"""
+    stat = os.stat(pdf_path)
+    key = hashlib.sha1(
+        f"{os.path.abspath(pdf_path)}|{stat.st_mtime}|{stat.st_size}|{dpi}".encode('utf-8')
+    ).hexdigest()
+    return os.path.join(PDF_CACHE_DIR, key)
+
+def _list_cached_pages(cache_dir: str) -> List[str]:
+    """按页码顺序列出缓存目录中的页面文件"""
+    names = [name for name in os.listdir(cache_dir) if name.startswith("page_") and name.endswith(".jpg")]
+    names.sort(key=lambda name: int(name[5:-4]))
+    return [os.path.join(cache_dir, name) for name in names]
+
+def _prune_pdf_cache() -> None:
+    """PDF页面缓存数超过PDF_CACHE_MAX_ENTRIES时，按最近使用时间删除最旧的缓存"""
     try:
-        images = convert_from_path(pdf_path)
-        converted_images = []
-        for i, img in enumerate(images):
-            # 将图片转换为字节数据
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            img_byte_arr.seek(0)
-            converted_images.append((img_byte_arr.getvalue(), i+1))
-        return converted_images
+        with os.scandir(PDF_CACHE_DIR) as entries:
+            # mkdtemp创建的tmp*目录是正在写入的缓存，不参与淘汰
+            cached = [entry for entry in entries if entry.is_dir() and not entry.name.startswith("tmp")]
+        if len(cached) <= PDF_CACHE_MAX_ENTRIES:
+            return
+        cached.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in cached[:len(cached) - PDF_CACHE_MAX_ENTRIES]:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    except OSError as e:
+        logger.warning("清理PDF页面缓存失败: %s", e)
+
+def convert_pdf_to_images(pdf_path: str, dpi: int = PDF_RENDER_DPI,
+                          thread_count: Optional[int] = None) -> Iterator[Tuple[bytes, int]]:
+    """将PDF文件逐页转换为图片字节数据
+
+    已安装pypdfium2时在进程内渲染，省去每个PDF启动pdfinfo/pdftoppm子进程的开销；
+    否则回退到pdf2image（Poppler）。页面均编码为JPEG逐页产出，避免所有页面同时
+    以PIL图像的形式驻留内存，扫描页使用JPEG也能显著减少Base64编码和上传的数据量。
+
+    渲染结果按PDF路径、修改时间、大小和dpi缓存到磁盘，文件未变化时直接读取缓存页面；
+    缓存最多保留PDF_CACHE_MAX_ENTRIES份，超出时淘汰最久未使用的缓存。
+    视觉模型会将输入缩放到约1000余像素，dpi默认150已足够，无需使用pdf2image默认的200。
+    thread_count为Poppler渲染使用的进程数，默认为CPU核数。
+    """
+    try:
+        cache_dir = _pdf_cache_dir(pdf_path, dpi)
+        if os.path.isdir(cache_dir):
+            logger.info("命中PDF页面缓存: %s", pdf_path)
+            # 更新修改时间作为最近使用时间，供淘汰时参考
+            try:
+                os.utime(cache_dir)
+            except OSError:
+                pass
+            for i, page_path in enumerate(_list_cached_pages(cache_dir)):
+                yield (_read_file(page_path), i+1)
+            return
+            
+        # 先写入临时目录，全部页面渲染完成后再原子地替换为正式缓存目录
+        os.makedirs(PDF_CACHE_DIR, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=PDF_CACHE_DIR)
+        try:
+            for image_bytes, page_number in _render_pdf(pdf_path, dpi, thread_count):
+                with open(os.path.join(tmp_dir, f"page_{page_number}.jpg"), 'wb') as f:
+                    f.write(image_bytes)
+                yield (image_bytes, page_number)
+            try:
+                os.replace(tmp_dir, cache_dir)
+            except OSError as e:
+                # 其他进程可能已先写入同一缓存目录（目录非空时替换失败），此时直接使用已有缓存；
+                # 页面已全部产出，缓存写入失败不影响本次转换结果
+                if not os.path.isdir(cache_dir):
+                    logger.warning("写入PDF页面缓存失败: %s", e)
+            else:
+                _prune_pdf_cache()
+        finally:
+            if os.path.isdir(tmp_dir):
+                shutil.rmtree(tmp_dir, ignore_errors=True)
     except Exception as e:
-        logger.error(f"PDF转换失败: {str(e)}")
+        logger.error("PDF转换失败: %s", e)
         raise
 
-def get_input_files() -> List[Tuple[bytes, Optional[int]]]:
-    """获取input文件夹中的所有图片和PDF文件"""
+def _load_pdf_pages(pdf_path: str, dpi: int = PDF_RENDER_DPI,
+                    thread_count: Optional[int] = None) -> List[Tuple[bytes, int]]:
+    """转换单个PDF文件，失败时记录日志并返回空列表"""
+    try:
+        return list(convert_pdf_to_images(pdf_path, dpi, thread_count))
+    except Exception as e:
+        logger.error("处理PDF文件 %s 失败: %s", pdf_path, e)
+        # 异常堆栈只在DEBUG级别输出，控制台（INFO级别）不会收到也不会格式化
+        logger.debug("处理PDF文件 %s 失败的异常堆栈", pdf_path, exc_info=True)
+        return []
+
+def get_input_files(dpi: int = PDF_RENDER_DPI) -> Iterator[Tuple[bytes, Optional[int]]]:
+    """逐个产出input文件夹中的所有图片和PDF页面，按需读取和渲染，PDF按dpi分辨率渲染"""
     input_dir = "input"
     os.makedirs(input_dir, exist_ok=True)
     
-    result_files = []
-    
-    # 获取所有图片文件
-    for ext in ['*.jpg', '*.jpeg', '*.png', '*.gif', '*.bmp']:
-        for file_path in glob.glob(os.path.join(input_dir, ext)) + glob.glob(os.path.join(input_dir, ext.upper())):
-            try:
-                with open(file_path, 'rb') as f:
-                    image_bytes = f.read()
-                result_files.append((image_bytes, None))
-            except Exception as e:
-                logger.error(f"读取图片文件 {file_path} 失败: {str(e)}")
+    # 单次遍历目录，按扩展名（不区分大小写）区分图片和PDF
+    image_paths = []
+    pdf_paths = []
+    with os.scandir(input_dir) as entries:
+        for entry in entries:
+            # 与glob一样跳过隐藏文件，如macOS生成的._*.jpg（AppleDouble）和.DS_Store
+            if entry.name.startswith('.') or not entry.is_file():
                 continue
+            if _IMAGE_RE.search(entry.name):
+                image_paths.append(entry.path)
+            elif _PDF_RE.search(entry.name):
+                pdf_paths.append(entry.path)
+    
+    # 按文件路径排序，保证每次运行的输入顺序一致
+    image_paths.sort()
+    pdf_paths.sort()
     
-    # 获取所有PDF文件
-    for pdf_path in glob.glob(os.path.join(input_dir, "*.pdf")) + glob.glob(os.path.join(input_dir, "*.PDF")):
+    # 读取所有图片文件
+    for file_path in image_paths:
         try:
-            converted_images = convert_pdf_to_images(pdf_path)
-            result_files.extend(converted_images)
+            image_bytes = _read_file(file_path)
         except Exception as e:
-            logger.error(f"处理PDF文件 {pdf_path} 失败: {str(e)}")
+            logger.error("读取图片文件 %s 失败: %s", file_path, e)
             continue
+        yield (image_bytes, None)
     
-    return sorted(result_files, key=lambda x: x[1] if x[1] is not None else 0)
+    # PDF统一经由_load_pdf_pages整份转换，某一页渲染失败时整份PDF被丢弃，不会把不完整的文档交给模型。
+    # 多个PDF时并行转换。使用Poppler时渲染由子进程完成，线程等待期间不占用GIL；
+    # 使用PDFium时渲染调用由_PDFIUM_LOCK串行化，只有JPEG编码和缓存写入并行。
+    # 同时转换的PDF数不超过CPU核数，CPU核数在各PDF之间平分给Poppler，避免进程数超过核数相互争抢；
+    # executor.map按提交顺序返回，各PDF的页面保持连续且按页码排列
+    if pdf_paths:
+        cpu_count = os.cpu_count() or 1
+        max_workers = min(len(pdf_paths), cpu_count)
+        thread_count = max(1, cpu_count // max_workers)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for converted_images in executor.map(
+                lambda path: _load_pdf_pages(path, dpi, thread_count), pdf_paths
+            ):
+                yield from converted_images
+
+def _dump_json(data: Any) -> bytes:
+    """将数据序列化为缩进格式的UTF-8 JSON字节串，已安装orjson时优先使用"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+
+# 默认输出文件名的时间戳在启动时只取一次，同一次运行内的多个结果按序号区分
+_RUN_STAMP = int(time.time())
+_result_counter = itertools.count()
+
+def _next_result_name() -> str:
+    """生成默认输出文件名：首个结果为result_<时间戳>，之后依次追加序号"""
+    index = next(_result_counter)
+    return f"result_{_RUN_STAMP}" if index == 0 else f"result_{_RUN_STAMP}_{index}"
 
-def save_result(result: Dict[str, Any], output_dir: str = "output", output_format: str = "json") -> None:
-    """保存处理结果"""
+def save_result(result: Dict[str, Any], output_dir: str = "output", output_format: str = "json",
+                create_dir: bool = True, base_name: Optional[str] = None) -> None:
+    """保存处理结果，调用方已创建输出目录时可传入create_dir=False跳过目录检查，
+    可通过base_name指定输出文件名（不含扩展名）"""
     try:
-        os.makedirs(output_dir, exist_ok=True)
+        if create_dir:
+            os.makedirs(output_dir, exist_ok=True)
         
         # 生成输出文件名
-        base_name = f"result_{int(time.time())}"
+        if base_name is None:
+            base_name = _next_result_name()
         output_path = os.path.join(output_dir, f"{base_name}.{output_format}")
         
+        # 先在内存中生成完整内容，再一次性写入文件，避免多次小块写入
         if output_format.lower() == "json":
-            with open(output_path, "w", encoding="utf-8") as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            content = _dump_json(result)
         else:
-            with open(output_path, "w", encoding="utf-8") as f:
-                f.write("\n=== 识别结果 ===\n")
-                f.write(result.get('recognition_result', '无内容'))
-                f.write("\n\n=== 分析结果 ===\n")
-                f.write(result.get('analysis_result', '无分析结果'))
+            content = "".join((
+                "\n=== 识别结果 ===\n",
+                result.get('recognition_result', '无内容'),
+                "\n\n=== 分析结果 ===\n",
+                result.get('analysis_result', '无分析结果')
+            )).encode("utf-8")
+        with open(output_path, "wb") as f:
+            f.write(content)
                 
-        logger.info(f"结果已保存到: {output_path}")
+        logger.info("结果已保存到: %s", output_path)
         
     except Exception as e:
-        logger.error(f"保存结果失败: {str(e)}")
+        logger.error("保存结果失败: %s", e)
         raise
 
 def main():
     """主函数"""
+    from chat2table.models.config import ModelConfig
+    from chat2table.chains.image_processing import ImageProcessingChain
+    
     try:
         # 获取API密钥
         api_key = get_api_key()
         
-        # 初始化配置
-        config = ModelConfig(api_key=api_key)
+        # 初始化配置；命令行有意使用temperature=0而非ModelConfig默认的0.1：
+        # 表格提取需要稳定的输出，相同输入可直接命中响应缓存
+        config = ModelConfig(api_key=api_key, temperature=0)
         
-        # 初始化图像处理器
-        processor = ImageProcessingChain(config)
+        # 初始化图像处理器；设置环境变量CHAT2TABLE_NO_CACHE=1时不使用响应缓存，每次都重新请求模型
+        no_cache = os.getenv("CHAT2TABLE_NO_CACHE", "").strip().lower() not in ("", "0", "false")
+        processor = ImageProcessingChain(config, cache_dir=None if no_cache else ".llm_cache")
         
-        # 获取输入文件
-        input_files = get_input_files()
-        if not input_files:
-            logger.warning("在input文件夹中未找到任何文件")
-            return
-            
-        logger.info(f"在input文件夹中找到 {len(input_files)} 个文件")
+        # 输出目录只在启动时解析并创建一次
+        output_dir = os.path.abspath("output")
+        os.makedirs(output_dir, exist_ok=True)
         
-        # 收集所有图片数据
+        # 逐个读取输入文件，收集所有图片数据
         image_data_list = []
-        for image_data, page_number in input_files:
+        for image_data, page_number in get_input_files():
             try:
                 if page_number is not None:
-                    logger.info(f"正在读取PDF第 {page_number} 页")
+                    logger.info("正在读取第 %s 个文件（PDF第 %s 页）", len(image_data_list) + 1, page_number)
                 else:
-                    logger.info("正在读取图片文件")
+                    logger.info("正在读取第 %s 个文件（图片）", len(image_data_list) + 1)
                 image_data_list.append(image_data)
             except Exception as e:
-                logger.error(f"读取文件时出错: {str(e)}")
+                logger.error("读取文件时出错: %s", e)
                 continue
         
         if image_data_list:
             # 批量处理所有图片
-            logger.info(f"已成功读取 {len(image_data_list)} 个文件，正在统一打包给大模型进行分析...")
+            logger.info("已成功读取 %s 个文件，正在统一打包给大模型进行分析...", len(image_data_list))
+            # 使用同步接口，模型调用经由共享的httpx.Client连接池（支持时启用HTTP/2）
             result = processor.process_multiple_images(image_data_list)
             
             if "error" in result:
                 logger.error(result["error"])
                 return
+                
+            if result["status"] == "skipped":
+                logger.warning("未识别到有效内容，未进行分析")
             
-            # 保存结果
-            save_result(result)
+            # 保存结果；跳过分析时同样保存，便于查看识别结果为何被判定为空
+            save_result(result, output_dir, create_dir=False)
         else:
-            logger.error("没有成功读取任何文件")
+            logger.warning("在input文件夹中未找到任何可读取的文件")
                 
     except Exception as e:
-        logger.error(f"程序执行失败: {str(e)}")
+        logger.error("程序执行失败: %s", e)
+        logger.debug("程序执行失败的异常堆栈", exc_info=True)
         raise
 
 if __name__ == "__main__":
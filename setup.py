@@ -9,6 +9,8 @@ setup(
     install_requires=[
         "langchain-core>=0.1.0",
         "langchain-openai>=0.0.2",
+        "httpx>=0.23.0",
+        "pybase64>=1.3.0",
         "Pillow>=10.0.0",
         "requests>=2.31.0",
     ],
@@ -4,7 +4,14 @@ Chat2Table - 一个用于将图片和PDF转换为结构化数据的工具包
 
 __version__ = "0.1.0"
 
-from .models.config import ModelConfig
-from .chains.image_processing import ImageProcessingChain
+def __getattr__(name: str):
+    # 延迟到首次访问时再导入，只使用utils等轻量子模块时不必加载LangChain
+    if name == "ModelConfig":
+        from .models.config import ModelConfig
+        return ModelConfig
+    if name == "ImageProcessingChain":
+        from .chains.image_processing import ImageProcessingChain
+        return ImageProcessingChain
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 __all__ = ["ModelConfig", "ImageProcessingChain"] 
\ No newline at end of file
@@ -1,32 +1,151 @@
-import base64
+try:
+    # pybase64基于SIMD指令实现，编码大图时明显快于标准库，且可直接返回str，省去一次decode复制
+    import pybase64
+except ImportError:
+    pybase64 = None
+    import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import Dict, Any, Optional, Union, List
+from typing import Dict, Any, Optional, Union, List, Iterator
 import requests
+import requests.adapters
 from langchain_core.output_parsers import StrOutputParser
-from langchain_core.runnables import RunnablePassthrough
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
 from langchain_core.messages import HumanMessage, SystemMessage
-from langchain_core.prompts import ChatPromptTemplate
 import io
-from PIL import Image
+import threading
+from PIL import Image, ImageOps
 
 from ..models.config import ModelConfig
 from ..prompts.image_recognition import IMAGE_RECOGNITION_TEMPLATE
-from ..prompts.analysis import ANALYSIS_TEMPLATE
-from ..utils.logger import logger
+from ..prompts.analysis import ANALYSIS_TEMPLATE, format_analysis_prompt
+from ..utils.logger import logger, is_debug_enabled
+from ..utils.cache import ResponseCache
+from ..utils.rate_limiter import RateLimiter
+
+# 下载图片共用的HTTP会话，复用连接池避免每次下载重新建立TCP/TLS连接
+_HTTP_SESSION = requests.Session()
+_HTTP_SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+_HTTP_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+
+# 下载图片的超时时间（秒）
+DOWNLOAD_TIMEOUT = 30
+
+# 每个线程复用的图片编码缓冲区
+_thread_local = threading.local()
+
+def _get_encode_buffer() -> io.BytesIO:
+    """获取当前线程复用的BytesIO缓冲区，已清空并定位到开头"""
+    buffer = getattr(_thread_local, "buffer", None)
+    if buffer is None:
+        buffer = _thread_local.buffer = io.BytesIO()
+    buffer.seek(0)
+    buffer.truncate(0)
+    return buffer
+
+def _encode_pil_image(img: Image.Image) -> bytes:
+    """将PIL图像编码为字节数据，带透明通道的图片保留为PNG，其余压缩为JPEG"""
+    img_byte_arr = _get_encode_buffer()
+    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+        # 转为RGB会把透明区域压平成底层颜色（通常为黑色），透明背景上的深色文字将无法辨认
+        img.save(img_byte_arr, format='PNG')
+    else:
+        if img.mode not in ('RGB', 'L'):
+            img = img.convert('RGB')
+        img.save(img_byte_arr, format='JPEG', quality=85)
+    return img_byte_arr.getvalue()
+
+def _guess_mime_type(image_data: bytes) -> str:
+    """根据文件头判断图片的MIME类型，无法识别时按JPEG处理"""
+    if image_data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png"
+    if image_data.startswith((b'GIF87a', b'GIF89a')):
+        return "image/gif"
+    if image_data.startswith(b'BM'):
+        return "image/bmp"
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return "image/webp"
+    return "image/jpeg"
+
+def _to_data_url(image_data: bytes) -> str:
+    """将图片数据编码为Base64 data URL，一次拼接出完整的URL字符串"""
+    if pybase64 is not None:
+        encoded = pybase64.b64encode_as_string(image_data)
+    else:
+        encoded = base64.b64encode(image_data).decode('ascii')
+    return "".join(("data:", _guess_mime_type(image_data), ";base64,", encoded))
 
 class ImageProcessingChain:
     """图像处理链"""
     
-    def __init__(self, config: ModelConfig, debug: bool = True):
+    # 并发准备图片时的最大线程数
+    MAX_WORKERS = 10
+    
+    # 分批识别时同时进行的识别请求数上限，需结合DashScope的QPS限制调整
+    MAX_CONCURRENCY = 8
+    
+    # 单次识别请求包含的最大图片数，超过时分批并发识别；为None时不分批，所有图片在同一请求中识别，
+    # 模型才能判断跨页表格的连续性，分批后批次边界处的跨页信息会丢失
+    RECOGNITION_BATCH_SIZE: Optional[int] = None
+    
+    # 固定不变的提示消息只构建一次，各次调用共享
+    _RECOGNITION_SYSTEM_MESSAGE = SystemMessage(content="你是一个专业的图像分析助手，擅长详细描述图像内容。")
+    _RECOGNITION_TEXT_BLOCK = {"type": "text", "text": IMAGE_RECOGNITION_TEMPLATE}
+    _ANALYSIS_SYSTEM_MESSAGE = SystemMessage(content="你是一个专业的数据分析助手，擅长从文本中提取结构化信息。")
+    
+    # 识别结果短于该长度或为占位内容时视为空白，跳过分析
+    MIN_RECOGNITION_LENGTH = 20
+    EMPTY_RECOGNITION_RESULTS = frozenset({"无", "无内容", "无法识别"})
+    
+    # 超过该大小（字节）的图片在上传前缩小并重新压缩
+    SHRINK_THRESHOLD = 512_000
+    
+    # 缩小后图片的最大边长（像素），视觉模型会在内部缩放，超出此值的分辨率不会提升识别效果
+    MAX_IMAGE_SIDE = 1568
+    
+    # 限流时单张图片预计消耗的输入token数
+    ESTIMATED_IMAGE_TOKENS = 1280
+    
+    def __init__(self, config: ModelConfig, debug: bool = True, cache_dir: Optional[str] = ".llm_cache",
+                 cache_ttl: Optional[float] = None, max_concurrency: Optional[int] = None,
+                 batch_size: Optional[int] = None, pass_image_urls: bool = False):
         """
         初始化图像处理链
         
         Args:
             config: 模型配置
             debug: 是否启用调试模式
+            cache_dir: 模型响应缓存目录，为None时不使用缓存；
+                temperature大于0时输出不确定，缓存同样不启用
+            cache_ttl: 缓存有效期（秒），为None时永不过期
+            max_concurrency: 分批识别时同时进行的识别请求数上限，为None时使用MAX_CONCURRENCY
+            batch_size: 单次识别请求包含的最大图片数，为None时使用RECOGNITION_BATCH_SIZE（默认不分批）；
+                设为1时每张图片单独发起一次识别请求，分批后跨批次的表格连续性无法识别
+            pass_image_urls: 是否将http(s)图片URL直接交给模型服务端拉取，省去本地下载和Base64编码；
+                默认关闭。开启后内网地址等服务端无法访问的图片会识别失败，远程大图也不会经过本地缩小
         """
         self.config = config
         self.debug = debug
+        self.pass_image_urls = pass_image_urls
+        
+        # 按实例覆盖并发度与批大小，便于根据账号的QPS/TPM限额调整
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency必须大于0")
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("batch_size必须大于0")
+        self.max_concurrency = max_concurrency if max_concurrency is not None else self.MAX_CONCURRENCY
+        self.batch_size = batch_size if batch_size is not None else self.RECOGNITION_BATCH_SIZE
+        
+        # 初始化响应缓存
+        self.cache = ResponseCache(cache_dir, ttl=cache_ttl) if cache_dir and config.temperature == 0 else None
+        
+        # 识别与分析模型的限额分别计算，各用一个限流器；未配置限额时不限流
+        if config.rpm or config.tpm:
+            self._recognition_limiter = RateLimiter(config.rpm, config.tpm)
+            self._analysis_limiter = RateLimiter(config.rpm, config.tpm)
+        else:
+            self._recognition_limiter = None
+            self._analysis_limiter = None
         
         # 初始化模型
         self.recognition_model = config.get_recognition_model()
@@ -35,6 +154,10 @@ class ImageProcessingChain:
         # 初始化输出解析器
         self.output_parser = StrOutputParser()
         
+        # 初始化处理链，避免每次调用重复构建
+        self._recognition_chain = self._create_recognition_chain()
+        self._analysis_chain = self._create_analysis_chain()
+        
     def _download_image(self, image_url: str) -> bytes:
         """
         从URL下载图片到内存
@@ -46,57 +169,56 @@ class ImageProcessingChain:
             bytes: 图片二进制数据
         """
         try:
-            response = requests.get(image_url)
+            response = _HTTP_SESSION.get(image_url, timeout=DOWNLOAD_TIMEOUT)
             response.raise_for_status()
             return response.content
         except Exception as e:
-            logger.error(f"下载图片失败: {str(e)}")
+            logger.error("下载图片失败: %s", e)
             raise
             
     def _encode_image(self, image_data: bytes) -> str:
         """
-        将图片编码为Base64
+        将图片编码为Base64 data URL
         
         Args:
             image_data: 图片二进制数据
             
         Returns:
-            str: Base64编码的图片数据
+            str: 可直接用作image_url的data URL
         """
         try:
-            return base64.b64encode(image_data).decode('utf-8')
+            return _to_data_url(image_data)
         except Exception as e:
-            logger.error(f"图片编码失败: {str(e)}")
+            logger.error("图片编码失败: %s", e)
             raise
             
     def _create_recognition_chain(self):
         """创建识别链"""
         def create_messages(x):
-            human_messages = []
             # 添加所有图片
-            for img in x["images"]:
-                human_messages.append({
-                    "type": "image_url",
-                    "image_url": {"url": f"data:image/jpeg;base64,{img}"}
-                })
+            human_messages = [
+                {"type": "image_url", "image_url": {"url": img}}
+                for img in x["images"]
+            ]
             # 添加文本提示
-            human_messages.append({
-                "type": "text",
-                "text": IMAGE_RECOGNITION_TEMPLATE
-            })
+            human_messages.append(self._RECOGNITION_TEXT_BLOCK)
             messages = [
-                SystemMessage(content="你是一个专业的图像分析助手，擅长详细描述图像内容。"),
+                self._RECOGNITION_SYSTEM_MESSAGE,
                 HumanMessage(content=human_messages)
             ]
-            # 记录输入提示到日志文件
-            logger.debug("=== 图像识别输入提示 ===")
-            logger.debug(f"系统提示: {messages[0].content}")
-            logger.debug(f"用户提示: {IMAGE_RECOGNITION_TEMPLATE}")
+            # 记录输入提示到日志文件，没有处理器接收DEBUG日志时整段跳过
+            if is_debug_enabled(logger):
+                logger.debug("=== 图像识别输入提示 ===")
+                logger.debug("系统提示: %s", messages[0].content)
+                logger.debug("用户提示: %s", IMAGE_RECOGNITION_TEMPLATE)
             return messages
 
         return (
             RunnablePassthrough.assign(
-                images=lambda x: [self._encode_image(img) for img in x["image_data_list"]]
+                images=lambda x: [
+                    img if isinstance(img, str) else self._encode_image(img)
+                    for img in x["image_data_list"]
+                ]
             )
             | create_messages
             | self.recognition_model
@@ -107,24 +229,157 @@ class ImageProcessingChain:
         """创建分析链"""
         def create_messages(x):
             messages = [
-                SystemMessage(content="你是一个专业的数据分析助手，擅长从文本中提取结构化信息。"),
-                HumanMessage(content=ANALYSIS_TEMPLATE.format(recognition_result=x["recognition_result"]))
+                self._ANALYSIS_SYSTEM_MESSAGE,
+                HumanMessage(content=format_analysis_prompt(x["recognition_result"]))
             ]
-            # 记录输入提示到日志文件
-            logger.debug("=== 数据分析输入提示 ===")
-            logger.debug(f"系统提示: {messages[0].content}")
-            logger.debug(f"用户提示: {ANALYSIS_TEMPLATE}")
+            # 记录输入提示到日志文件，没有处理器接收DEBUG日志时整段跳过
+            if is_debug_enabled(logger):
+                logger.debug("=== 数据分析输入提示 ===")
+                logger.debug("系统提示: %s", messages[0].content)
+                logger.debug("用户提示: %s", ANALYSIS_TEMPLATE)
             return messages
 
+        # 提示词由format_analysis_prompt直接拼接生成，无需经过模板解析或额外的输入映射
         return (
-            RunnablePassthrough.assign(
-                recognition_result=lambda x: x["recognition_result"]
-            )
-            | create_messages
+            RunnableLambda(create_messages)
             | self.analysis_model
             | self.output_parser
         )
         
+    def _is_empty_recognition(self, recognition_result: str) -> bool:
+        """判断识别结果是否为空或无意义的占位内容（如空白页），此时无需调用分析模型"""
+        content = recognition_result.strip()
+        return len(content) < self.MIN_RECOGNITION_LENGTH or content in self.EMPTY_RECOGNITION_RESULTS
+        
+    def _recognition_cache_key(self, image_bytes_list: List[Union[bytes, str]]) -> Optional[str]:
+        """
+        计算识别结果的缓存键，未启用缓存或包含远程URL（内容可能变化）时返回None
+
+        max_tokens影响输出是否被截断，base_url决定实际调用的服务，二者同样参与计算
+        """
+        if self.cache is None or any(isinstance(img, str) for img in image_bytes_list):
+            return None
+        return ResponseCache.make_key(
+            *image_bytes_list,
+            IMAGE_RECOGNITION_TEMPLATE.encode('utf-8'),
+            self.config.recognition_model.encode('utf-8'),
+            str(self.config.max_tokens).encode('utf-8'),
+            self.config.base_url.encode('utf-8')
+        )
+        
+    def _analysis_cache_key(self, recognition_result: str) -> Optional[str]:
+        """计算分析结果的缓存键，未启用缓存时返回None"""
+        if self.cache is None:
+            return None
+        return ResponseCache.make_key(
+            recognition_result.encode('utf-8'),
+            ANALYSIS_TEMPLATE.encode('utf-8'),
+            self.config.analysis_model.encode('utf-8'),
+            str(self.config.max_tokens).encode('utf-8'),
+            self.config.base_url.encode('utf-8')
+        )
+        
+    def _get_cached(self, key: Optional[str], name: str) -> Optional[str]:
+        """读取缓存的结果，未启用缓存或未命中时返回None"""
+        if key is None:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            logger.info("命中%s缓存", name)
+        return cached
+        
+    def _estimate_recognition_tokens(self, image_bytes_list: List[bytes]) -> int:
+        """估算一次识别请求消耗的token数，用于限流时预先扣减配额"""
+        return (len(image_bytes_list) * self.ESTIMATED_IMAGE_TOKENS
+                + len(IMAGE_RECOGNITION_TEMPLATE) + self.config.max_tokens)
+        
+    def _estimate_analysis_tokens(self, recognition_result: str) -> int:
+        """估算一次分析请求消耗的token数，中文按每字一个token粗略计算"""
+        return len(ANALYSIS_TEMPLATE) + len(recognition_result) + self.config.max_tokens
+        
+    def _recognize(self, image_bytes_list: List[bytes]) -> str:
+        """
+        识别图片内容，命中缓存时跳过模型调用
+        
+        Args:
+            image_bytes_list: 图片二进制数据列表
+            
+        Returns:
+            str: 识别结果
+        """
+        key = self._recognition_cache_key(image_bytes_list)
+        cached = self._get_cached(key, "识别结果")
+        if cached is not None:
+            return cached
+                
+        if self._recognition_limiter is not None:
+            self._recognition_limiter.acquire(self._estimate_recognition_tokens(image_bytes_list))
+                
+        logger.info("正在进行图片识别...")
+        recognition_response = self._recognition_chain.invoke({"image_data_list": image_bytes_list})
+        recognition_result = recognition_response.content if hasattr(recognition_response, 'content') else recognition_response
+        
+        if key is not None:
+            self.cache.put(key, recognition_result)
+        return recognition_result
+        
+    def _split_batches(self, image_bytes_list: List[bytes]) -> List[List[bytes]]:
+        """按batch_size将图片分批，未设置批大小时全部图片作为一批"""
+        batch_size = self.batch_size
+        if batch_size is None:
+            return [image_bytes_list]
+        return [image_bytes_list[i:i + batch_size] for i in range(0, len(image_bytes_list), batch_size)]
+        
+    def _recognize_in_batches(self, image_bytes_list: List[bytes]) -> str:
+        """
+        将图片分批并发识别，同时进行的识别请求数不超过max_concurrency，按原始顺序合并识别结果
+        
+        Args:
+            image_bytes_list: 图片二进制数据列表
+            
+        Returns:
+            str: 合并后的识别结果
+        """
+        batches = self._split_batches(image_bytes_list)
+        if len(batches) == 1:
+            return self._recognize(image_bytes_list)
+            
+        results = [None] * len(batches)
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+            futures = {executor.submit(self._recognize, batch): i for i, batch in enumerate(batches)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if self.debug:
+                    logger.debug("第 %s/%s 批图片识别完成", i + 1, len(batches))
+                    
+        return "\n\n".join(results)
+        
+    def _analyze(self, recognition_result: str) -> str:
+        """
+        分析识别结果，命中缓存时跳过模型调用
+        
+        Args:
+            recognition_result: 识别结果
+            
+        Returns:
+            str: 分析结果
+        """
+        key = self._analysis_cache_key(recognition_result)
+        cached = self._get_cached(key, "分析结果")
+        if cached is not None:
+            return cached
+                
+        if self._analysis_limiter is not None:
+            self._analysis_limiter.acquire(self._estimate_analysis_tokens(recognition_result))
+                
+        analysis_response = self._analysis_chain.invoke({"recognition_result": recognition_result})
+        analysis_result = analysis_response.content if hasattr(analysis_response, 'content') else analysis_response
+        
+        if key is not None:
+            self.cache.put(key, analysis_result)
+        return analysis_result
+        
     def _convert_to_bytes(self, image_data: Union[str, bytes, io.BytesIO, Image.Image]) -> bytes:
         """
         将不同类型的图片数据转换为字节数据
@@ -145,14 +400,148 @@ class ImageProcessingChain:
         elif isinstance(image_data, bytes):
             return image_data
         elif isinstance(image_data, Image.Image):
-            # 将PIL.Image转换为字节数据
-            img_byte_arr = io.BytesIO()
-            image_data.save(img_byte_arr, format='JPEG')
-            return img_byte_arr.getvalue()
+            # 将PIL.Image转换为字节数据，带透明通道的图片保留为PNG，其余压缩为JPEG；
+            # 尺寸过大时先在副本上缩小，避免编码后再解码缩小一次，也不修改调用方的图片
+            if max(image_data.size) > self.MAX_IMAGE_SIDE:
+                image_data = image_data.copy()
+                image_data.thumbnail((self.MAX_IMAGE_SIDE, self.MAX_IMAGE_SIDE), Image.LANCZOS)
+            return _encode_pil_image(image_data)
         else:
             raise ValueError(f"不支持的图片数据类型: {type(image_data)}")
         
-    def process_image(self, image_data: Union[str, bytes, io.BytesIO, Image.Image], stream: bool = False) -> Dict[str, Any]:
+    def _shrink_image(self, image_bytes: bytes) -> bytes:
+        """
+        缩小过大的图片并重新压缩，减少上传数据量和输入token；
+        按EXIF方向信息摆正图片，带透明通道的图片保留为PNG
+        
+        Args:
+            image_bytes: 图片二进制数据
+            
+        Returns:
+            bytes: 处理后的图片二进制数据，无需处理或处理失败时原样返回
+        """
+        if len(image_bytes) <= self.SHRINK_THRESHOLD:
+            return image_bytes
+            
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                # 重新编码会丢弃EXIF，需先按方向信息旋转，否则手机拍摄的照片会以旋转后的状态交给模型
+                rotated = img.getexif().get(0x0112, 1) != 1
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((self.MAX_IMAGE_SIDE, self.MAX_IMAGE_SIDE), Image.LANCZOS)
+                shrunk = _encode_pil_image(img)
+        except Exception as e:
+            logger.warning("压缩图片失败，使用原始数据: %s", e)
+            return image_bytes
+            
+        # 已摆正方向的图片即使没有变小也使用处理后的数据
+        return shrunk if rotated or len(shrunk) < len(image_bytes) else image_bytes
+        
+    def _prepare_image(self, image_data: Union[str, bytes, io.BytesIO, Image.Image]) -> Union[bytes, str]:
+        """
+        将图片数据转换为可发送给模型的形式
+        
+        Args:
+            image_data: 图片数据
+            
+        Returns:
+            Union[bytes, str]: 开启pass_image_urls时http(s) URL原样返回，由模型服务端拉取；
+                其余转换为字节数据，过大的图片先缩小
+        """
+        if self.pass_image_urls and isinstance(image_data, str) and image_data.startswith(('http://', 'https://')):
+            return image_data
+        return self._shrink_image(self._convert_to_bytes(image_data))
+        
+    def _prepare_images(self, image_data_list: List[Union[str, bytes, io.BytesIO, Image.Image]]) -> List[Union[bytes, str]]:
+        """
+        并发准备多张图片数据
+        
+        Args:
+            image_data_list: 图片数据列表
+            
+        Returns:
+            List[Union[bytes, str]]: 与输入顺序一致的图片数据列表，元素含义见_prepare_image
+        """
+        if not image_data_list:
+            return []
+
+        total = len(image_data_list)
+
+        def convert(item):
+            i, image_data = item
+            if self.debug:
+                logger.debug("正在准备第 %s/%s 张图片", i, total)
+            return self._prepare_image(image_data)
+
+        with ThreadPoolExecutor(max_workers=min(self.MAX_WORKERS, total)) as executor:
+            return list(executor.map(convert, enumerate(image_data_list, 1)))
+        
+    def _stream_images(self, image_bytes_list: List[bytes], result_info: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """
+        流式执行识别与分析，边生成边返回
+        
+        流式模式不读写响应缓存，每次调用都会请求模型
+        
+        Args:
+            image_bytes_list: 图片二进制数据列表
+            result_info: 附加到最终结果中的信息
+            
+        Yields:
+            Dict[str, Any]: 识别/分析过程中的文本片段（stage为recognition或analysis），
+                最后一项为处理结果（stage为done、skipped或error）。分析结果只以片段形式产出，
+                不在最终结果中重复拼接，需要完整文本的调用方自行累积analysis片段
+        """
+        try:
+            # 流式识别，识别结果需完整拼接后才能进入分析
+            if self._recognition_limiter is not None:
+                self._recognition_limiter.acquire(self._estimate_recognition_tokens(image_bytes_list))
+            logger.info("正在进行图片识别...")
+            recognition_parts = []
+            for chunk in self._recognition_chain.stream({"image_data_list": image_bytes_list}):
+                recognition_parts.append(chunk)
+                yield {"stage": "recognition", "content": chunk}
+            recognition_result = "".join(recognition_parts)
+                
+            if self._is_empty_recognition(recognition_result):
+                logger.warning("识别结果为空，跳过分析")
+                yield {
+                    "stage": "skipped",
+                    "status": "skipped",
+                    "reason": "empty_recognition",
+                    **result_info,
+                    "recognition_result": recognition_result
+                }
+                return
+                
+            if self.debug:
+                logger.info("图片识别完成，正在进行文字处理...")
+                
+            # 流式分析
+            if self._analysis_limiter is not None:
+                self._analysis_limiter.acquire(self._estimate_analysis_tokens(recognition_result))
+            for chunk in self._analysis_chain.stream({"recognition_result": recognition_result}):
+                yield {"stage": "analysis", "content": chunk}
+                
+            if self.debug:
+                logger.info("分析完成")
+                
+            yield {
+                "stage": "done",
+                "status": "success",
+                **result_info,
+                "recognition_result": recognition_result
+            }
+            
+        except Exception as e:
+            logger.error("流式处理图片时出现错误: %s", e)
+            yield {
+                "stage": "error",
+                "status": "error",
+                **result_info,
+                "error": str(e)
+            }
+        
+    def process_image(self, image_data: Union[str, bytes, io.BytesIO, Image.Image], stream: bool = False) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
         """
         处理单张图片
         
@@ -161,32 +550,39 @@ class ImageProcessingChain:
             stream: 是否使用流式输出
             
         Returns:
-            Dict[str, Any]: 处理结果
+            Union[Dict[str, Any], Iterator[Dict[str, Any]]]: 处理结果；
+                流式模式下总是返回迭代器，准备图片失败时只产出一项error结果，参见_stream_images
         """
         try:
             if self.debug:
-                logger.info(f"开始处理图片: {image_data if isinstance(image_data, str) else '<binary data>'}")
+                logger.info("开始处理图片: %s", image_data if isinstance(image_data, str) else '<binary data>')
 
-            # 转换图片数据为字节
-            image_bytes = self._convert_to_bytes(image_data)
+            # 转换图片数据为字节，过大的图片先缩小
+            image_bytes = self._prepare_image(image_data)
             
-            # 创建识别链
-            recognition_chain = self._create_recognition_chain()
+            if stream:
+                return self._stream_images(
+                    [image_bytes],
+                    {"image_url": image_data if isinstance(image_data, str) else None}
+                )
             
             # 执行识别
-            logger.info("正在进行图片识别...")
-            recognition_response = recognition_chain.invoke({"image_data_list": [image_bytes]})
-            recognition_result = recognition_response.content if hasattr(recognition_response, 'content') else recognition_response
+            recognition_result = self._recognize([image_bytes])
             
+            if self._is_empty_recognition(recognition_result):
+                logger.warning("识别结果为空，跳过分析")
+                return {
+                    "status": "skipped",
+                    "reason": "empty_recognition",
+                    "image_url": image_data if isinstance(image_data, str) else None,
+                    "recognition_result": recognition_result
+                }
+                
             if self.debug:
                 logger.info("图片识别完成，正在进行文字处理...")
                 
-            # 创建分析链
-            analysis_chain = self._create_analysis_chain()
-            
             # 执行分析
-            analysis_response = analysis_chain.invoke({"recognition_result": recognition_result})
-            analysis_result = analysis_response.content if hasattr(analysis_response, 'content') else analysis_response
+            analysis_result = self._analyze(recognition_result)
             
             if self.debug:
                 logger.info("分析完成")
@@ -200,63 +596,66 @@ class ImageProcessingChain:
             }
             
         except Exception as e:
-            error_msg = f"处理图片时出现错误: {str(e)}"
-            logger.error(error_msg)
-            return {
+            logger.error("处理图片时出现错误: %s", e)
+            error_result = {
                 "status": "error",
                 "image_url": image_data if isinstance(image_data, str) else None,
                 "error": str(e)
             }
+            # 流式模式下调用方按迭代器消费，准备阶段的错误同样以error阶段产出
+            if stream:
+                return iter([{"stage": "error", **error_result}])
+            return error_result
 
-    def process_multiple_images(self, image_data_list: List[Union[str, bytes, io.BytesIO, Image.Image]], stream: bool = False) -> Dict[str, Any]:
+    def process_multiple_images(self, image_data_list: List[Union[str, bytes, io.BytesIO, Image.Image]], stream: bool = False) -> Union[Dict[str, Any], Iterator[Dict[str, Any]]]:
         """
         批量处理多张图片
         
+        图片作为同一条用户消息中的多个image_url内容块发送给模型；设置了batch_size
+        且图片数超过该值时分批并发识别，按原始顺序合并后再对整体识别结果做一次分析。
+        
         Args:
             image_data_list: 图片数据列表，每个元素可以是URL、二进制数据、BytesIO对象或PIL.Image对象
             stream: 是否使用流式输出
             
         Returns:
-            Dict[str, Any]: 处理结果
+            Union[Dict[str, Any], Iterator[Dict[str, Any]]]: 处理结果；
+                流式模式下总是返回迭代器，准备图片失败时只产出一项error结果，参见_stream_images
         """
         try:
             if self.debug:
-                logger.info(f"开始批量处理 {len(image_data_list)} 张图片")
+                logger.info("开始批量处理 %s 张图片", len(image_data_list))
 
-            # 处理所有图片数据
-            processed_images = []
-            for i, image_data in enumerate(image_data_list, 1):
-                if self.debug:
-                    logger.info(f"正在准备第 {i}/{len(image_data_list)} 张图片")
-                
-                # 转换图片数据为字节
-                image_bytes = self._convert_to_bytes(image_data)
-                processed_images.append(image_bytes)
+            # 并发准备所有图片数据（URL下载等为I/O密集型），结果按提交顺序返回
+            processed_images = self._prepare_images(image_data_list)
 
             if not processed_images:
                 raise ValueError("没有成功处理任何图片")
+                
+            if stream:
+                return self._stream_images(processed_images, {"image_count": len(image_data_list)})
 
-            # 创建识别链
-            recognition_chain = self._create_recognition_chain()
-            
-            # 执行识别
-            logger.info("正在进行图片识别...")
-            recognition_response = recognition_chain.invoke({"image_data_list": processed_images})
-            recognition_result = recognition_response.content if hasattr(recognition_response, 'content') else recognition_response
+            # 执行识别，设置了批大小且图片较多时分批并发
+            recognition_result = self._recognize_in_batches(processed_images)
             
             # 记录识别结果到日志文件
             logger.debug("=== 图像识别输出结果 ===")
             logger.debug(recognition_result)
             
+            if self._is_empty_recognition(recognition_result):
+                logger.warning("识别结果为空，跳过分析")
+                return {
+                    "status": "skipped",
+                    "reason": "empty_recognition",
+                    "image_count": len(image_data_list),
+                    "recognition_result": recognition_result
+                }
+                
             if self.debug:
                 logger.info("图片识别完成，正在进行文字处理...")
                 
-            # 创建分析链
-            analysis_chain = self._create_analysis_chain()
-            
             # 执行分析
-            analysis_response = analysis_chain.invoke({"recognition_result": recognition_result})
-            analysis_result = analysis_response.content if hasattr(analysis_response, 'content') else analysis_response
+            analysis_result = self._analyze(recognition_result)
             
             # 记录分析结果到日志文件
             logger.debug("=== 数据分析输出结果 ===")
@@ -274,9 +673,11 @@ class ImageProcessingChain:
             }
             
         except Exception as e:
-            error_msg = f"批量处理图片时出现错误: {str(e)}"
-            logger.error(error_msg)
-            return {
+            logger.error("批量处理图片时出现错误: %s", e)
+            error_result = {
                 "status": "error",
                 "error": str(e)
-            } 
\ No newline at end of file
+            }
+            if stream:
+                return iter([{"stage": "error", **error_result}])
+            return error_result
@@ -1,8 +1,41 @@
 from typing import Optional
+from functools import lru_cache
+import importlib.util
+import httpx
 from langchain_openai import ChatOpenAI
 import os
 from ..utils.logger import logger
 
+# httpx启用HTTP/2需要安装h2（pip install httpx[http2]），未安装时使用HTTP/1.1
+_HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# 单次模型请求的超时时间（秒）。OpenAI SDK会为每个请求单独传入超时，覆盖httpx客户端上的设置，
+# 因此在ChatOpenAI上配置；多张图片在同一请求中识别时生成耗时较长，取值需留足余量
+_REQUEST_TIMEOUT = 300
+
+@lru_cache(maxsize=1)
+def _get_http_client() -> httpx.Client:
+    """获取所有同步模型共用的HTTP客户端，在多次调用间保持长连接，支持时通过HTTP/2多路复用并发请求"""
+    return httpx.Client(
+        http2=_HTTP2_AVAILABLE,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+
+@lru_cache(maxsize=8)
+def _create_chat_model(api_key: str, base_url: str, model_name: str,
+                       temperature: float, max_tokens: int, verbose: bool = False) -> ChatOpenAI:
+    """创建聊天模型，相同参数复用同一实例及其底层连接池"""
+    return ChatOpenAI(
+        api_key=api_key,
+        base_url=base_url,
+        model_name=model_name,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=_REQUEST_TIMEOUT,
+        http_client=_get_http_client(),
+        verbose=verbose
+    )
+
 class ConfigError(Exception):
     """配置错误"""
     pass
@@ -16,7 +49,10 @@ class ModelConfig:
                  recognition_model: str = "qwen-vl-max",
                  analysis_model: str = "qwen-max",
                  temperature: float = 0.1,
-                 max_tokens: int = 2000):
+                 max_tokens: int = 2000,
+                 debug: bool = False,
+                 rpm: Optional[int] = None,
+                 tpm: Optional[int] = None):
         """
         初始化模型配置
         
@@ -27,6 +63,9 @@ class ModelConfig:
             analysis_model: 分析模型名称
             temperature: 温度参数
             max_tokens: 最大token数
+            debug: 是否启用LangChain的详细输出，关闭时省去回调相关开销
+            rpm: 每个模型每分钟最大请求数，为None时不限流
+            tpm: 每个模型每分钟最大token数，为None时不限流
             
         Raises:
             ConfigError: 当配置无效时抛出
@@ -35,6 +74,7 @@ class ModelConfig:
         self._validate_url(base_url)
         self._validate_models(recognition_model, analysis_model)
         self._validate_parameters(temperature, max_tokens)
+        self._validate_rate_limits(rpm, tpm)
         
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         self.base_url = base_url
@@ -42,6 +82,9 @@ class ModelConfig:
         self.analysis_model = analysis_model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.debug = debug
+        self.rpm = rpm
+        self.tpm = tpm
         
     def _validate_api_key(self, api_key: Optional[str]) -> None:
         """验证API密钥"""
@@ -64,31 +107,40 @@ class ModelConfig:
             raise ConfigError(f"temperature必须在0到1之间，当前值: {temperature}")
         if max_tokens <= 0:
             raise ConfigError(f"max_tokens必须大于0，当前值: {max_tokens}")
+            
+    def _validate_rate_limits(self, rpm: Optional[int], tpm: Optional[int]) -> None:
+        """验证限流参数"""
+        if rpm is not None and rpm <= 0:
+            raise ConfigError(f"rpm必须大于0，当前值: {rpm}")
+        if tpm is not None and tpm <= 0:
+            raise ConfigError(f"tpm必须大于0，当前值: {tpm}")
         
     def get_recognition_model(self) -> ChatOpenAI:
         """获取识别模型"""
         try:
-            return ChatOpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                model_name=self.recognition_model,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
+            return _create_chat_model(
+                self.api_key,
+                self.base_url,
+                self.recognition_model,
+                self.temperature,
+                self.max_tokens,
+                self.debug
             )
         except Exception as e:
-            logger.error(f"创建识别模型失败: {str(e)}")
+            logger.error("创建识别模型失败: %s", e)
             raise ConfigError(f"创建识别模型失败: {str(e)}")
         
     def get_analysis_model(self) -> ChatOpenAI:
         """获取分析模型"""
         try:
-            return ChatOpenAI(
-                api_key=self.api_key,
-                base_url=self.base_url,
-                model_name=self.analysis_model,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            ) 
+            return _create_chat_model(
+                self.api_key,
+                self.base_url,
+                self.analysis_model,
+                self.temperature,
+                self.max_tokens,
+                self.debug
+            )
         except Exception as e:
-            logger.error(f"创建分析模型失败: {str(e)}")
+            logger.error("创建分析模型失败: %s", e)
             raise ConfigError(f"创建分析模型失败: {str(e)}") 
\ No newline at end of file
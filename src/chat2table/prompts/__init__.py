@@ -1,6 +1,13 @@
 """提示词模板模块"""
 
-from .analysis import ANALYSIS_TEMPLATE, analysis_prompt
-from .image_recognition import IMAGE_RECOGNITION_TEMPLATE
+from .analysis import ANALYSIS_TEMPLATE, format_analysis_prompt, get_analysis_prompt
+from .image_recognition import IMAGE_RECOGNITION_TEMPLATE, get_image_recognition_prompt
+
+def __getattr__(name: str):
+    # analysis_prompt延迟到首次访问时构建，导入本模块时不再解析模板
+    if name == "analysis_prompt":
+        return get_analysis_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
  
-__all__ = ['ANALYSIS_TEMPLATE', 'analysis_prompt', 'IMAGE_RECOGNITION_TEMPLATE'] 
\ No newline at end of file
+__all__ = ['ANALYSIS_TEMPLATE', 'analysis_prompt', 'format_analysis_prompt', 'get_analysis_prompt',
+           'IMAGE_RECOGNITION_TEMPLATE', 'get_image_recognition_prompt']
\ No newline at end of file
@@ -1,3 +1,4 @@
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 
 # 分析提示词模板
@@ -53,4 +54,31 @@ ANALYSIS_TEMPLATE = """
 {recognition_result}
 """
 
-analysis_prompt = ChatPromptTemplate.from_template(ANALYSIS_TEMPLATE) 
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_analysis_prompt() -> ChatPromptTemplate:
+    """获取分析提示词模板，首次使用时才构建，之后复用同一实例"""
+    return ChatPromptTemplate.from_template(ANALYSIS_TEMPLATE)
+
+def __getattr__(name: str):
+    # 兼容原有的analysis_prompt模块属性，延迟到首次访问时构建
+    if name == "analysis_prompt":
+        return get_analysis_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# 预先按唯一的占位符拆分模板并还原转义的大括号，填充时只需拼接字符串，无需每次解析模板
+_ANALYSIS_PREFIX, _ANALYSIS_SUFFIX = (
+    part.replace("{{", "{").replace("}}", "}")
+    for part in ANALYSIS_TEMPLATE.split("{recognition_result}")
+)
+
+def format_analysis_prompt(recognition_result: str) -> str:
+    """
+    生成分析提示词，结果与ANALYSIS_TEMPLATE.format(recognition_result=...)一致
+
+    Args:
+        recognition_result: 图像识别结果
+
+    Returns:
+        str: 分析提示词
+    """
+    return _ANALYSIS_PREFIX + recognition_result + _ANALYSIS_SUFFIX 
\ No newline at end of file
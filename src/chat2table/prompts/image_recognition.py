@@ -1,3 +1,4 @@
+from functools import lru_cache
 from langchain_core.prompts import ChatPromptTemplate
 
 # 图像识别提示词模板
@@ -29,4 +30,13 @@ IMAGE_RECOGNITION_TEMPLATE = """
    - 对于表格中的每一行数据，请完整提取所有字段信息
 """
 
-image_recognition_prompt = ChatPromptTemplate.from_template(IMAGE_RECOGNITION_TEMPLATE) 
\ No newline at end of file
+@lru_cache(maxsize=None)
+def get_image_recognition_prompt() -> ChatPromptTemplate:
+    """获取图像识别提示词模板，首次使用时才构建，之后复用同一实例"""
+    return ChatPromptTemplate.from_template(IMAGE_RECOGNITION_TEMPLATE)
+
+def __getattr__(name: str):
+    # 兼容原有的image_recognition_prompt模块属性，延迟到首次访问时构建
+    if name == "image_recognition_prompt":
+        return get_image_recognition_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
@@ -1,5 +1,8 @@
 """工具函数模块"""
 
 from .logger import logger
+from .cache import ResponseCache
+from .env import get_api_key
+from .rate_limiter import RateLimiter
  
-__all__ = ["logger"] 
\ No newline at end of file
+__all__ = ["logger", "ResponseCache", "get_api_key", "RateLimiter"] 
\ No newline at end of file
@@ -0,0 +1,90 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Optional
+
+from .logger import logger
+
+class ResponseCache:
+    """基于磁盘的模型响应缓存"""
+
+    def __init__(self, cache_dir: str = ".llm_cache", ttl: Optional[float] = None):
+        """
+        初始化响应缓存
+
+        Args:
+            cache_dir: 缓存目录
+            ttl: 缓存有效期（秒），按缓存文件的修改时间计算，为None时永不过期
+        """
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: bytes) -> str:
+        """
+        根据输入内容生成缓存键
+
+        Args:
+            parts: 参与计算的二进制内容（图片数据、提示词、模型名称等）
+
+        Returns:
+            str: BLAKE2b（32字节）十六进制摘要
+        """
+        # BLAKE2b在64位CPU上明显快于SHA-256，对多MB的图片数据计算摘要开销更小；
+        # 每部分前写入长度，避免不同的分段方式拼接出相同的输入
+        digest = hashlib.blake2b(digest_size=32)
+        for part in parts:
+            digest.update(len(part).to_bytes(8, "little"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        """获取缓存文件路径"""
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        读取缓存
+
+        Args:
+            key: 缓存键
+
+        Returns:
+            Optional[str]: 缓存的响应内容，未命中时返回None
+        """
+        path = self._path(key)
+        try:
+            if self.ttl is not None and time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)["content"]
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning("读取缓存失败: %s", e)
+            return None
+
+    def put(self, key: str, content: str) -> None:
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            content: 响应内容
+        """
+        # 先写入临时文件再原子替换，并发写入或中途失败时不会留下不完整的缓存文件
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"content": content}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+        except Exception as e:
+            logger.warning("写入缓存失败: %s", e)
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
@@ -0,0 +1,42 @@
+import os
+from functools import lru_cache
+
+@lru_cache(maxsize=1)
+def _load_env_file(path: str, mtime: float) -> None:
+    """加载.env文件，同一文件未修改时只加载一次"""
+    from dotenv import load_dotenv
+    load_dotenv(path)
+
+def get_api_key(env_file: str = ".env") -> str:
+    """
+    获取DashScope API密钥
+
+    优先读取环境变量，已设置时不再访问.env文件；
+    否则加载.env文件后再次读取
+
+    Args:
+        env_file: .env文件路径
+
+    Returns:
+        str: API密钥
+
+    Raises:
+        ValueError: 未找到API密钥时抛出
+    """
+    api_key = os.environ.get("DASHSCOPE_API_KEY")
+    if api_key:
+        return api_key
+
+    try:
+        _load_env_file(env_file, os.path.getmtime(env_file))
+    except FileNotFoundError:
+        pass
+    api_key = os.environ.get("DASHSCOPE_API_KEY")
+
+    if not api_key:
+        raise ValueError(
+            "未找到API密钥。请通过以下方式之一设置：\n"
+            "1. 设置环境变量 DASHSCOPE_API_KEY\n"
+            "2. 在项目根目录创建.env文件并添加 DASHSCOPE_API_KEY=your_key"
+        )
+    return api_key
@@ -1,15 +1,41 @@
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import sys
 from datetime import datetime
 
-class CustomFormatter(logging.Formatter):
-    """自定义日志格式化器"""
-    def format(self, record):
-        # 如果消息是二进制数据，替换为占位符
-        if isinstance(record.msg, bytes):
-            record.msg = "<binary data>"
-        return super().format(record)
+class BinaryMessageFilter(logging.Filter):
+    """将二进制日志消息替换为占位符，避免把图片等大块数据转换为字符串"""
+    def filter(self, record):
+        if type(record.msg) is bytes:
+            record.msg = f"<binary {len(record.msg)}B>"
+        return True
+
+def is_debug_enabled(logger: logging.Logger) -> bool:
+    """
+    判断DEBUG日志是否会被实际输出
+
+    setup_logger将记录器级别固定为DEBUG，logger.isEnabledFor(logging.DEBUG)始终为真，
+    需要检查沿传播链的处理器级别才能知道DEBUG记录是否会被某个处理器接收
+
+    Args:
+        logger: 日志记录器
+
+    Returns:
+        bool: 存在接收DEBUG记录的处理器时返回True
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    current = logger
+    while current is not None:
+        if any(handler.level <= logging.DEBUG for handler in current.handlers):
+            return True
+        if not current.propagate:
+            break
+        current = current.parent
+    return False
 
 def setup_logger(name: str = None) -> logging.Logger:
     """
@@ -29,15 +55,17 @@ def setup_logger(name: str = None) -> logging.Logger:
     if logger.handlers:
         return logger
     
+    handlers = []
+    
     # 创建控制台处理器
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.INFO)
-    console_formatter = CustomFormatter(
+    console_formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
     console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
     
     # 检查是否是作为独立项目运行
     is_standalone = __package__ is None or __package__ == ""
@@ -49,12 +77,24 @@ def setup_logger(name: str = None) -> logging.Logger:
         log_file = os.path.join(log_dir, f"app_{datetime.now().strftime('%Y%m%d')}.log")
         file_handler = logging.FileHandler(log_file, encoding='utf-8')
         file_handler.setLevel(logging.DEBUG)
-        file_formatter = CustomFormatter(
+        file_formatter = logging.Formatter(
             '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         file_handler.setFormatter(file_formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+    
+    # 工作线程只需将日志记录放入队列，由后台监听线程统一写入各处理器，
+    # 避免并发处理图片时各线程争用输出流的锁
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setLevel(min(handler.level for handler in handlers))
+    queue_handler.addFilter(BinaryMessageFilter())
+    logger.addHandler(queue_handler)
+    
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
     
     return logger
 
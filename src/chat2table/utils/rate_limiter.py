@@ -0,0 +1,64 @@
+import threading
+import time
+from typing import Optional
+
+from .logger import logger
+
+class RateLimiter:
+    """按每分钟请求数（RPM）和每分钟token数（TPM）限流的令牌桶，在发起请求前预先扣减配额"""
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        """
+        初始化限流器
+
+        Args:
+            rpm: 每分钟最大请求数，为None时不限制
+            tpm: 每分钟最大token数，为None时不限制
+        """
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+
+    def _reserve(self, tokens: int) -> float:
+        """
+        按流逝时间补充配额后扣减本次请求所需配额
+
+        配额允许透支，透支部分由调用方等待相应时间后偿还，后到的请求会排在其后等待更久
+
+        Args:
+            tokens: 本次请求预计消耗的token数
+
+        Returns:
+            float: 需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._updated
+            self._updated = now
+
+            wait = 0.0
+            if self.rpm:
+                self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60) - 1
+                if self._requests < 0:
+                    wait = -self._requests * 60 / self.rpm
+            if self.tpm:
+                # 单次请求的预估值超过桶容量时按容量计，否则永远无法放行
+                self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60) - min(tokens, self.tpm)
+                if self._tokens < 0:
+                    wait = max(wait, -self._tokens * 60 / self.tpm)
+            return wait
+
+    def acquire(self, tokens: int = 0) -> None:
+        """
+        获取配额，不足时阻塞当前线程直到配额恢复
+
+        Args:
+            tokens: 本次请求预计消耗的token数
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            logger.debug("触发限流，等待 %.2f 秒", wait)
+            time.sleep(wait)